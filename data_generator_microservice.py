@@ -1,13 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from faker_data_generators import *  # Assuming all your generator functions are in this file
-from data_records_inserts import insert_records_method
+from data_records_inserts import insert_records_method, PartitionLoadError
 
 from loguru import logger
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
 import os
+import zlib
 import pyodbc
 import yaml
 
+# orjson is optional; fall back to the standard library serializer when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 app = Flask(__name__)
 CORS(app)
 app.json.sort_keys = False
@@ -98,6 +108,10 @@ def parse_json():
             "details" :output
         })
        
+        except PartitionLoadError as e:
+            logger.error(f"Error inserting data: {e}")
+            return jsonify({"error": "Data insertion partially failed", "details": e.to_dict()}), 400
+
         # Example response to confirm receipt and parsing
         except Exception as e:
             logger.error(f"Error inserting data: {e}")
@@ -145,9 +159,8 @@ def fetch_parent_primary_keys_from_db(parent_table_name, pk_column_name, limit):
     #return [key[0] for key in parent_keys]
     return parent_keys
 
-def generate_synthetic_data(central_table_metadata, parent_tables_metadata, child_tables_metadata, constraints):
-    logger.info("Generating Synthetic data")
-
+def build_key_relationships(constraints):
+    """Build the parent key store and the child->parent column mapping from the constraints."""
     dict_parent_primary_keys = {}  # To store generated primary keys
     dict_pk_fk_relationships = {}  # To store relationships
 
@@ -167,6 +180,13 @@ def generate_synthetic_data(central_table_metadata, parent_tables_metadata, chil
         if parent_key not in dict_parent_primary_keys:
             dict_parent_primary_keys[parent_key] = []
 
+    return dict_parent_primary_keys, dict_pk_fk_relationships
+
+def generate_synthetic_data(central_table_metadata, parent_tables_metadata, child_tables_metadata, constraints):
+    logger.info("Generating Synthetic data")
+
+    dict_parent_primary_keys, dict_pk_fk_relationships = build_key_relationships(constraints)
+
     # Generate data for parent tables based on the constraints
     parent_table_data = generate_parent_table_data(central_table_metadata,  dict_parent_primary_keys)
 
@@ -181,6 +201,31 @@ def generate_synthetic_data(central_table_metadata, parent_tables_metadata, chil
         "child_tables": child_table_data,
     }
 
+def iter_parent_table_rows(table_name, table_metadata, dict_parent_primary_keys):
+    """Yield generated rows for a central table one at a time, recording the keys used by child tables."""
+    records_to_generate = table_metadata.get("records_to_generate")
+
+    for _ in range(records_to_generate):
+        table_row = {}
+
+        for column in table_metadata['columns']:
+            column_name = column['COLUMN_NAME']
+            generator_name = column['selected_generator']
+            generator_func = get_generator_function(generator_name)
+
+            if generator_func:
+                generated_value = generator_func()  # Call the generator function
+            else:
+                generated_value = None  # No generator defined, set as None
+
+            table_row[column_name] = generated_value
+
+            current_node = f"{table_name}.{column_name}".lower()
+            if current_node in dict_parent_primary_keys:
+                dict_parent_primary_keys[current_node].append(generated_value)  # Append to the list
+
+        yield table_row
+
 def generate_parent_table_data(central_table_metadata, dict_parent_primary_keys):
   
     generated_data = []  # List to hold table data with metadata
@@ -198,38 +243,103 @@ def generate_parent_table_data(central_table_metadata, dict_parent_primary_keys)
         table_rows = []  # Hold rows for the current table
 
         if (generate_data):
-
-            for _ in range(records_to_generate):
-                table_row = {}
-
-                for column in table_metadata['columns']:
-                    column_name = column['COLUMN_NAME']
-                    generator_name = column['selected_generator']
-                    generator_func = get_generator_function(generator_name)
-
-                    if generator_func:
-                        generated_value = generator_func()  # Call the generator function
-                    else:
-                        generated_value = None  # No generator defined, set as None
-
-                    table_row[column_name] = generated_value
-
-                    current_node = f"{table_name}.{column_name}".lower()
-                    if current_node in dict_parent_primary_keys:
-                        dict_parent_primary_keys[current_node].append(generated_value)  # Append to the list
-
-                table_rows.append(table_row)
+            table_rows = list(iter_parent_table_rows(table_name, table_metadata, dict_parent_primary_keys))
 
             # Add table metadata and rows to the generated data
         generated_data.append({
             "table_type": "central",  # Central table type
             "table_name": table_name,
             "truncate_table": truncate_table,
+            "parallel_loaders": table_metadata.get("parallel_loaders", 1),
+            "clustered_key": table_metadata.get("clustered_key"),
             "columns": table_rows
             })
 
     return generated_data
 
+def iter_child_table_rows(table_name, table_metadata, dict_parent_primary_keys, dict_pk_fk_relationships, parent_key_pool_size=None):
+    """Yield generated rows for a child table one at a time, reusing session keys first and then database keys.
+
+    parent_key_pool_size caps how many parent keys are fetched from the database to sample from;
+    by default one key is fetched per new record.
+    """
+    records_to_generate = table_metadata.get("records_to_generate")
+    reusability_pct = table_metadata.get("reusability_pct",0)
+
+    reusable_records_count_total = 0
+
+    # Loop through each column in the child table and find its parent table/column
+    for column in table_metadata['columns']:
+        column_name = column['COLUMN_NAME']
+        parent_table_name = None
+        pk_column_name = None  # We'll dynamically fetch the primary key column name
+
+        # Look for the parent table and its primary key column associated with the foreign key column
+        child_column = f"{table_name.lower()}.{column_name.lower()}"
+        if child_column in dict_pk_fk_relationships:
+            parent_column = dict_pk_fk_relationships[child_column]
+            parent_table_name, pk_column_name = parent_column.split('.')
+
+            # Calculate reusable records based on the reusability percentage
+            parent_keys_generated_in_session = dict_parent_primary_keys.get(f"{parent_table_name.lower()}.{pk_column_name.lower()}", [])
+            reusable_records_count = int(len(parent_keys_generated_in_session) * (reusability_pct / 100))
+
+            # Use the parent keys generated in the current session if available
+            for _ in range(reusable_records_count):
+                table_row = {}
+
+                for col in table_metadata['columns']:
+                    col_name = col['COLUMN_NAME']
+
+                    if col_name.lower() == column_name.lower():
+                        # Reuse parent keys
+                        parent_value = random.choice(parent_keys_generated_in_session)
+                        table_row[col_name] = parent_value
+                    else:
+                        # Generate other values for the child table
+                        generator_name = col['selected_generator']
+                        generator_func = get_generator_function(generator_name)
+                        table_row[col_name] = generator_func() if generator_func else None
+
+                reusable_records_count_total += 1
+                yield table_row
+
+    # Calculate how many new records need to be generated
+    new_records_count = records_to_generate - reusable_records_count_total
+
+    # Fetch remaining records from the parent table if necessary
+    if new_records_count > 0:
+        logger.debug(f"Fetching {new_records_count} more parent keys from the database")
+        
+        # For each column, determine which parent table to query for additional keys
+        for column in table_metadata['columns']:
+            column_name = column['COLUMN_NAME']
+            child_column = f"{table_name.lower()}.{column_name.lower()}"
+            if child_column in dict_pk_fk_relationships:
+                parent_column = dict_pk_fk_relationships[child_column]
+                parent_table_name, pk_column_name = parent_column.split('.')
+
+                key_fetch_limit = min(new_records_count, parent_key_pool_size) if parent_key_pool_size else new_records_count
+                parent_keys = fetch_parent_primary_keys_from_db(parent_table_name, pk_column_name, key_fetch_limit)
+
+                for _ in range(new_records_count):
+                    table_row = {}
+
+                    for col in table_metadata['columns']:
+                        col_name = col['COLUMN_NAME']
+
+                        if col_name.lower() == column_name.lower():
+                            # Reuse keys from the fetched parent records
+                            parent_value = random.choice(parent_keys)
+                            table_row[col_name] = parent_value
+                        else:
+                            # Generate other values for the child table
+                            generator_name = col['selected_generator']
+                            generator_func = get_generator_function(generator_name)
+                            table_row[col_name] = generator_func() if generator_func else None
+
+                    yield table_row
+
 def generate_child_table_data(child_tables_metadata, dict_parent_primary_keys, dict_pk_fk_relationships):
 
     generated_data = []  # List to hold child table data with metadata
@@ -247,89 +357,146 @@ def generate_child_table_data(child_tables_metadata, dict_parent_primary_keys, d
         reusable_records = []
 
         if (generate_data):
-            # Initialize a list to hold all reusable records
-           
-
-            # Loop through each column in the child table and find its parent table/column
-            for column in table_metadata['columns']:
-                column_name = column['COLUMN_NAME']
-                parent_table_name = None
-                pk_column_name = None  # We'll dynamically fetch the primary key column name
-
-                # Look for the parent table and its primary key column associated with the foreign key column
-                child_column = f"{table_name.lower()}.{column_name.lower()}"
-                if child_column in dict_pk_fk_relationships:
-                    parent_column = dict_pk_fk_relationships[child_column]
-                    parent_table_name, pk_column_name = parent_column.split('.')
-
-                    # Calculate reusable records based on the reusability percentage
-                    parent_keys_generated_in_session = dict_parent_primary_keys.get(f"{parent_table_name.lower()}.{pk_column_name.lower()}", [])
-                    reusable_records_count = int(len(parent_keys_generated_in_session) * (reusability_pct / 100))
-
-                    # Use the parent keys generated in the current session if available
-                    for _ in range(reusable_records_count):
-                        table_row = {}
-
-                        for col in table_metadata['columns']:
-                            col_name = col['COLUMN_NAME']
-
-                            if col_name.lower() == column_name.lower():
-                                # Reuse parent keys
-                                parent_value = random.choice(parent_keys_generated_in_session)
-                                table_row[col_name] = parent_value
-                            else:
-                                # Generate other values for the child table
-                                generator_name = col['selected_generator']
-                                generator_func = get_generator_function(generator_name)
-                                table_row[col_name] = generator_func() if generator_func else None
-
-                        reusable_records.append(table_row)
-
-            # Calculate how many new records need to be generated
-            new_records_count = records_to_generate - len(reusable_records)
-
-            # Fetch remaining records from the parent table if necessary
-            if new_records_count > 0:
-                logger.debug(f"Fetching {new_records_count} more parent keys from the database")
-                
-                # For each column, determine which parent table to query for additional keys
-                for column in table_metadata['columns']:
-                    column_name = column['COLUMN_NAME']
-                    child_column = f"{table_name.lower()}.{column_name.lower()}"
-                    if child_column in dict_pk_fk_relationships:
-                        parent_column = dict_pk_fk_relationships[child_column]
-                        parent_table_name, pk_column_name = parent_column.split('.')
-
-                        parent_keys = fetch_parent_primary_keys_from_db(parent_table_name, pk_column_name, new_records_count)
-
-                        for _ in range(new_records_count):
-                            table_row = {}
-
-                            for col in table_metadata['columns']:
-                                col_name = col['COLUMN_NAME']
-
-                                if col_name.lower() == column_name.lower():
-                                    # Reuse keys from the fetched parent records
-                                    parent_value = random.choice(parent_keys)
-                                    table_row[col_name] = parent_value
-                                else:
-                                    # Generate other values for the child table
-                                    generator_name = col['selected_generator']
-                                    generator_func = get_generator_function(generator_name)
-                                    table_row[col_name] = generator_func() if generator_func else None
-
-                            reusable_records.append(table_row)
+            reusable_records = list(iter_child_table_rows(table_name, table_metadata, dict_parent_primary_keys, dict_pk_fk_relationships))
 
 
         generated_data.append({
                 "table_type": "child",  # Child table type
                 "table_name": table_name,
                 "truncate_table": truncate_table,
+                "parallel_loaders": table_metadata.get("parallel_loaders", 1),
+                "clustered_key": table_metadata.get("clustered_key"),
                 "columns": reusable_records
             })
 
     return generated_data
 
+# Default number of rows serialized into a single NDJSON line by /generate/stream
+STREAM_CHUNK_SIZE = 1000
+
+# Parent keys fetched from the database per foreign key column when streaming; child rows sample from this pool
+STREAM_PARENT_KEY_POOL_SIZE = 10000
+
+def _json_default(value):
+    """Serialize the types that Faker generators and pyodbc hand back but JSON has no notion of."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)  # Keep full precision, float() would round money values
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def serialize_ndjson_line(payload):
+    """Serialize one payload to a newline-terminated NDJSON line, using orjson when it is available."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(payload, default=_json_default, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+def iter_table_chunks(table_type, table_name, rows, chunk_size):
+    """Group a row iterator into row batches, one NDJSON payload per batch."""
+    chunk = []
+    chunk_index = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield {"table_type": table_type, "table_name": table_name, "chunk": chunk_index, "rows": chunk}
+            chunk = []
+            chunk_index += 1
+    if chunk:
+        yield {"table_type": table_type, "table_name": table_name, "chunk": chunk_index, "rows": chunk}
+
+def validate_stream_metadata(central_table_metadata, child_tables_metadata):
+    """Return an error message for the first table that cannot be generated, or None if all are valid."""
+    for table_name, table_metadata in {**central_table_metadata, **child_tables_metadata}.items():
+        if not isinstance(table_metadata, dict):
+            return f"Table {table_name}: metadata must be an object"
+        if not table_metadata.get("generate_data"):
+            continue
+        records_to_generate = table_metadata.get("records_to_generate")
+        if not isinstance(records_to_generate, int) or isinstance(records_to_generate, bool) or records_to_generate < 0:
+            return f"Table {table_name}: records_to_generate must be a non-negative integer"
+        columns = table_metadata.get("columns")
+        if not isinstance(columns, list):
+            return f"Table {table_name}: columns must be a list"
+        for column in columns:
+            if not isinstance(column, dict) or "COLUMN_NAME" not in column or "selected_generator" not in column:
+                return f"Table {table_name}: each column needs COLUMN_NAME and selected_generator"
+    return None
+
+def iter_synthetic_data_tables(central_table_metadata, child_tables_metadata, constraints):
+    """Yield (table_type, table_name, rows) for each table to stream; rows is a lazy row iterator."""
+    logger.info("Streaming Synthetic data")
+
+    dict_parent_primary_keys, dict_pk_fk_relationships = build_key_relationships(constraints)
+
+    for table_name, table_metadata in central_table_metadata.items():
+        if not table_metadata.get("generate_data"):
+            continue
+        logger.info(f"Streaming parent table {table_name}")
+        yield "central", table_name, iter_parent_table_rows(table_name, table_metadata, dict_parent_primary_keys)
+
+    for table_name, table_metadata in child_tables_metadata.items():
+        if not table_metadata.get("generate_data"):
+            continue
+        logger.info(f"Streaming child table {table_name}")
+        yield "child", table_name, iter_child_table_rows(table_name, table_metadata, dict_parent_primary_keys, dict_pk_fk_relationships, STREAM_PARENT_KEY_POOL_SIZE)
+
+@app.route('/generate/stream', methods=['POST'])
+def stream_generated_data():
+    """Stream generated rows as NDJSON (one row batch per line) without inserting them.
+
+    Row batches are generated lazily, and child tables sample foreign keys from at most
+    STREAM_PARENT_KEY_POOL_SIZE database keys. The one structure that still grows with the
+    output is dict_parent_primary_keys: every key generated for a central table referenced
+    by a constraint is kept so that child tables can reuse it.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    data = request.get_json()
+    central_table_metadata = data.get('central_table_metadata', {})
+    child_tables_metadata = data.get('child_tables_metadata', {})
+    constraints = data.get('constraints', [])
+
+    try:
+        chunk_size = int(request.args.get('chunk_size', STREAM_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({"error": "chunk_size must be an integer"}), 400
+    if chunk_size < 1:
+        return jsonify({"error": "chunk_size must be greater than zero"}), 400
+
+    if not isinstance(central_table_metadata, dict) or not isinstance(child_tables_metadata, dict):
+        return jsonify({"error": "central_table_metadata and child_tables_metadata must be objects"}), 400
+    metadata_error = validate_stream_metadata(central_table_metadata, child_tables_metadata)
+    if metadata_error:
+        return jsonify({"error": metadata_error}), 400
+
+    use_gzip = request.args.get('gzip', 'false').lower() == 'true'
+
+    def generate():
+        # wbits=31 produces a gzip container; each chunk is flushed so clients can decode incrementally
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        current_table = None
+        try:
+            for table_type, table_name, rows in iter_synthetic_data_tables(central_table_metadata, child_tables_metadata, constraints):
+                current_table = table_name
+                for payload in iter_table_chunks(table_type, table_name, rows, chunk_size):
+                    line = serialize_ndjson_line(payload)
+                    yield compressor.compress(line) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else line
+        except Exception as e:
+            logger.error(f"Error streaming synthetic data for table {current_table}: {e}")
+            line = serialize_ndjson_line({"error": "Data generation failed", "table_name": current_table})
+            yield compressor.compress(line) if compressor else line
+        if compressor:
+            yield compressor.flush()
+        logger.info("Synthetic data stream completed.")
+
+    headers = {"X-Accel-Buffering": "no"}  # Stop reverse proxies from buffering the chunked response
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=headers)
 
 
 
@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 import pyodbc
 from loguru import logger
 
@@ -10,6 +12,16 @@ LOG_FILE = "logs/db_inserts.log"
 # Batch size for insertion
 BATCH_SIZE = 10000
 
+# Parallel partitioned loading: retries per partition and the backoff between them
+PARTITION_RETRIES = 3
+PARTITION_RETRY_BACKOFF_SECONDS = 2
+
+# Upper bound on concurrent loaders (connections) for a single table
+MAX_PARALLEL_LOADERS = int(os.getenv("MAX_PARALLEL_LOADERS", "16"))
+
+# SQLSTATEs worth retrying: deadlock victim / serialization failure and communication link failure
+TRANSIENT_SQLSTATES = {"40001", "08S01"}
+
 # Switch for enabling/disabling terminal logging
 DEV_MODE = os.getenv("DEV_MODE", "False").lower() == "true"
 
@@ -39,6 +51,28 @@ DB_CONFIG = {
     "pwd": os.getenv("DB_PWD", "pcuser")
 }
 
+# Raised when some partitions of a parallel load fail; carries what the other partitions committed
+class PartitionLoadError(Exception):
+    def __init__(self, table_name, partition_results):
+        self.table_name = table_name
+        self.partition_results = partition_results
+        self.failed_partitions = [result["partition"] for result in partition_results if "error" in result]
+        self.completed_results = None  # Results of tables loaded before this one, set by insert_records_method
+        super().__init__(
+            f"{len(self.failed_partitions)} of {len(partition_results)} partitions of {table_name} failed "
+            f"(partitions {self.failed_partitions}); the other partitions were committed."
+        )
+
+    def to_dict(self):
+        return {
+            "table_name": self.table_name,
+            "inserted": sum(result["inserted"] for result in self.partition_results),
+            "duplicates": sum(result["duplicates"] for result in self.partition_results),
+            "failed_partitions": self.failed_partitions,
+            "partitions": self.partition_results,
+            "completed_results": self.completed_results
+        }
+
 # Function to validate table names
 def validate_table_name(table_name):
     if not table_name.isidentifier():
@@ -107,18 +141,181 @@ def insert_data_in_batches(connection, table_name, rows):
 
     return {"table_name": table_name, "inserted": inserted_count, "duplicates": duplicate_count}
 
+# Function to split rows into contiguous partitions ordered on the clustered key
+def partition_rows(rows, partition_count, clustered_key=None):
+    if clustered_key:
+        # Each loader gets its own key range, so concurrent inserts don't fight over the same index pages
+        rows = sorted(rows, key=lambda row: (row.get(clustered_key) is None, row.get(clustered_key)))
+    # Exactly partition_count near-equal slices; the first `remainder` slices take one extra row
+    partition_size, remainder = divmod(len(rows), partition_count)
+    partitions = []
+    start = 0
+    for index in range(partition_count):
+        end = start + partition_size + (1 if index < remainder else 0)
+        partitions.append(rows[start:end])
+        start = end
+    return partitions
+
+# Function to decide whether a database error is worth retrying
+def is_transient_db_error(error):
+    if isinstance(error, pyodbc.OperationalError):
+        return True
+    sqlstate = error.args[0] if error.args else None
+    # 1205 is SQL Server's deadlock victim error number
+    return sqlstate in TRANSIENT_SQLSTATES or "(1205)" in str(error)
+
+# Function to insert and commit one batch on a loader's connection
+def insert_batch(connection, insert_query, values):
+    inserted_count = 0
+    duplicate_count = 0
+    with connection.cursor() as cursor:
+        for value in values:
+            try:
+                cursor.execute(insert_query, value)
+                inserted_count += 1
+            except pyodbc.IntegrityError as e:
+                if is_transient_db_error(e):
+                    raise
+                duplicate_count += 1
+                logger.warning(f"Duplicate key error: {e}")
+    connection.commit()
+    return inserted_count, duplicate_count
+
+# Function to load one partition over its own connection, retrying the uncommitted batch on transient failures
+def insert_partition(table_name, insert_query, partition_index, rows):
+    connection = None
+    error = None
+    inserted_count = 0
+    duplicate_count = 0
+    retries = 0
+    backoff_seconds = 0
+    start_time = time.perf_counter()
+
+    try:
+        connection = connect_to_db()
+        if not connection:
+            raise ConnectionError(f"Failed to connect to the database for partition {partition_index} of {table_name}.")
+
+        batch_start = 0
+        while batch_start < len(rows):
+            batch = rows[batch_start:batch_start + BATCH_SIZE]
+            values = [tuple(row.values()) for row in batch]
+            try:
+                batch_inserted, batch_duplicates = insert_batch(connection, insert_query, values)
+            except pyodbc.Error as e:
+                if not is_transient_db_error(e):
+                    raise
+                retries += 1
+                if retries > PARTITION_RETRIES:
+                    raise
+                logger.warning(f"Retrying partition {partition_index} of {table_name} from row {batch_start} (attempt {retries}): {e}")
+                try:
+                    connection.rollback()
+                except pyodbc.Error:
+                    pass
+                try:
+                    connection.close()
+                except pyodbc.Error:
+                    pass
+                connection = None
+                backoff = PARTITION_RETRY_BACKOFF_SECONDS * retries
+                time.sleep(backoff)
+                backoff_seconds += backoff
+                connection = connect_to_db()
+                if not connection:
+                    raise ConnectionError(f"Failed to reconnect for partition {partition_index} of {table_name}.")
+                continue
+
+            inserted_count += batch_inserted
+            duplicate_count += batch_duplicates
+            batch_start += BATCH_SIZE
+    except Exception as e:
+        error = e
+        logger.error(f"Partition {partition_index} of {table_name} failed after {retries} retries: {e}")
+    finally:
+        if connection is not None:
+            connection.close()
+
+    elapsed = time.perf_counter() - start_time
+    # Throughput counts only inserted rows over the time spent loading, not duplicates or retry backoff
+    load_seconds = elapsed - backoff_seconds
+    rows_per_second = round(inserted_count / load_seconds, 2) if load_seconds > 0 else None
+    logger.info(f"Partition {partition_index} of {table_name}: {inserted_count} inserted, {duplicate_count} duplicates in {elapsed:.2f}s ({rows_per_second} rows/s)")
+
+    result = {
+        "partition": partition_index,
+        "rows": len(rows),
+        "inserted": inserted_count,
+        "duplicates": duplicate_count,
+        "retries": retries,
+        "elapsed_seconds": round(elapsed, 3),
+        "backoff_seconds": backoff_seconds,
+        "rows_per_second": rows_per_second
+    }
+    if error is not None:
+        result["error"] = str(error)
+    return result
+
+# Function to insert data into a table over several connections in parallel
+def insert_data_in_parallel(table_name, rows, parallel_loaders, clustered_key=None):
+    validate_table_name(table_name)
+    if not rows:
+        logger.warning(f"No data to insert into {table_name}.")
+        return {"table_name": table_name, "inserted": 0, "duplicates": 0, "partitions": []}
+
+    columns = rows[0].keys()
+    column_names = ", ".join(columns)
+    placeholders = ", ".join(["?"] * len(columns))
+    insert_query = f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})"
+
+    partitions = partition_rows(rows, min(parallel_loaders, MAX_PARALLEL_LOADERS, len(rows)), clustered_key)
+    logger.info(f"Inserting data into table: {table_name} over {len(partitions)} parallel loaders")
+
+    with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+        futures = [
+            executor.submit(insert_partition, table_name, insert_query, index, partition)
+            for index, partition in enumerate(partitions)
+        ]
+        partition_results = [future.result() for future in futures]
+
+    if any("error" in result for result in partition_results):
+        load_error = PartitionLoadError(table_name, partition_results)
+        logger.error(f"Error inserting data into {table_name}: {load_error}")
+        raise load_error
+
+    return {
+        "table_name": table_name,
+        "inserted": sum(result["inserted"] for result in partition_results),
+        "duplicates": sum(result["duplicates"] for result in partition_results),
+        "partitions": partition_results
+    }
+
 # Table processor function
 def process_table(connection, table_data):
     table_name = table_data.get("table_name")
     truncate = table_data.get("truncate_table", False)
     rows = table_data.get("columns", [])
+    parallel_loaders = table_data.get("parallel_loaders", 1)
+    clustered_key = table_data.get("clustered_key")
 
     if not table_name or not isinstance(rows, list):
         raise ValueError("Invalid table data. 'table_name' must be a string and 'columns' must be a list.")
 
+    if not isinstance(parallel_loaders, int) or parallel_loaders < 1:
+        raise ValueError("Invalid table data. 'parallel_loaders' must be a positive integer.")
+
+    if clustered_key and rows and clustered_key not in rows[0]:
+        raise ValueError(f"Invalid table data. 'clustered_key' {clustered_key} is not a column of {table_name}.")
+
+    if parallel_loaders > 1 and not clustered_key:
+        logger.warning(f"Table {table_name} uses {parallel_loaders} parallel loaders without a 'clustered_key'; partitions will overlap in key order and may contend for locks.")
+
     if truncate:
         truncate_table(connection, table_name)
 
+    if parallel_loaders > 1:
+        return insert_data_in_parallel(table_name, rows, parallel_loaders, clustered_key)
+
     return insert_data_in_batches(connection, table_name, rows)
 
 # Core insert method for external or API use
@@ -135,19 +332,23 @@ def insert_records_method(data):
     if not connection:
         raise ConnectionError("Failed to connect to the database.")
 
+    parent_results = []
+    child_results = []
     try:
         logger.info("Processing parent tables...")
-        parent_results = []
         for table_data in parent_tables:
             parent_results.append(process_table(connection, table_data))
 
         logger.info("Processing child tables...")
-        child_results = []
         for table_data in child_tables:
             child_results.append(process_table(connection, table_data))
 
         logger.info("Data insertion completed successfully.")
         return {"parent_results": parent_results, "child_results": child_results}
+    except PartitionLoadError as ple:
+        # Report the tables that were fully loaded before the partial one
+        ple.completed_results = {"parent_results": parent_results, "child_results": child_results}
+        raise
     finally:
         connection.close()
         logger.info("Database connection closed.")
@@ -164,6 +365,10 @@ def insert_records():
             results = insert_records_method(data)
             return jsonify({"message": "Records processed successfully.", "results": results}), 200
 
+        except PartitionLoadError as ple:
+            logger.error(f"Partial load error: {ple}")
+            return jsonify({"error": f"Partial load error: {str(ple)}", "results": ple.to_dict()}), 500
+
         except ValueError as ve:
             logger.error(f"Validation error: {ve}")
             return jsonify({"error": f"Validation error: {str(ve)}"}), 400